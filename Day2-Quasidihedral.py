@@ -28,13 +28,41 @@ chris.kimmel@live.com
 '''
 
 from io import BytesIO
-from random import seed, randrange
+from os import environ
+from random import seed, randbytes
 from unittest import TestCase
 
 
 # pylint: disable=invalid-name
 
 
+def _times(a, b):
+    '''Multiply two elements of G given as ints in the range 0-255.'''
+    k1, k2 = a & 127, b & 127
+    j1, j2 = (a >> 7) & 1, (b >> 7) & 1
+
+    # s r^k = r^{63k} s, so k2 is scaled by 63 = 1 + 62 exactly when j1 == 1.
+    retval_j = j1 ^ j2
+    retval_k = (k1 + (1 + 62*j1)*k2) & 127
+    return (retval_j << 7) | retval_k
+
+
+def _inverse(a):
+    '''Invert an element of G given as an int in the range 0-255.'''
+    k, j = a % 128, (a & 128)
+    return 128 + (63*(128 - k) % 128) if j else (128 - k) % 128
+
+
+# MUL_TABLE[256*a + b] is the product ab, INV_TABLE[a] is the inverse of a and
+# DEC_TABLE[256*a + b] is the product (a^{-1})b, with elements of G given as
+# ints. All three are built once at import time so that the per-byte work in
+# the stream functions is a single table lookup.
+MUL_TABLE = bytes(_times(a, b) for a in range(256) for b in range(256))
+INV_TABLE = bytes(_inverse(a) for a in range(256))
+DEC_TABLE = bytes(MUL_TABLE[(INV_TABLE[a] << 8) | b]
+                  for a in range(256) for b in range(256))
+
+
 def quasidihedral_256_times(a, b):
     '''
     Arguments:
@@ -46,15 +74,8 @@ def quasidihedral_256_times(a, b):
     Ensures:
         len(c) == 1
     '''
-    a, b = int.from_bytes(a, 'little', signed=False), int.from_bytes(b, 'little', signed=False)
-    k1, k2 = a % 128, b % 128
-    j1, j2 = (a >> 7) & 1, (b >> 7) & 1
-
-    retval_j = j1 ^ j2
-    retval_k = (k1 + 63*k2) % 128 if j1 else (k1 + k2) % 128
-    retval = 128*retval_j + retval_k
-
-    return retval.to_bytes(1, 'little', signed=False)
+    i = (a[0] << 8) | b[0]
+    return MUL_TABLE[i:i+1]
 
 
 def quasidihedral_256_inverse(a):
@@ -68,16 +89,50 @@ def quasidihedral_256_inverse(a):
     Ensures:
         len(b) == 1
     '''
-    a = int.from_bytes(a, 'little', signed=False)
-    k, j = a % 128, (a & 128)
-    retval = 128 + (63*(128 - k) % 128) if j else (128 - k) % 128
-    retval = retval.to_bytes(1, 'little', signed=False)
-    return retval
+    i = a[0]
+    return INV_TABLE[i:i+1]
+
+
+# ELEMENTS[x] is the one-byte bytes object representing the element x of G.
+ELEMENTS = [x.to_bytes(1, 'little', signed=False) for x in range(256)]
 
+IDENTITY = ELEMENTS[0]
+S = ELEMENTS[128]
+R = ELEMENTS[1]
 
-IDENTITY = (0).to_bytes(1, 'little', signed=False)
-S = (128).to_bytes(1, 'little', signed=False)
-R = (1).to_bytes(1, 'little', signed=False)
+# The stream functions read and write in blocks of this many bytes.
+CHUNK_SIZE = 1 << 16
+
+# Plaintext length for the fuzz test; set FUZZ_LEN in the environment to run a
+# longer stress test.
+FUZZ_LEN = int(environ.get('FUZZ_LEN', '1024'))
+
+
+def _encrypt(data, running_product=0):
+    '''
+    Return the bytearray whose x-th entry is the product of
+    running_product * data[0:x+1], where data is any bytes-like object and
+    running_product is an int. This is the hot loop of stream_encryptor.
+    '''
+    table = MUL_TABLE
+    out = bytearray(len(data))
+    for i, byte in enumerate(data):
+        running_product = table[(running_product << 8) | byte]
+        out[i] = running_product
+    return out
+
+
+def _decrypt(data, last_element=0):
+    '''
+    Invert _encrypt: return the bytearray whose x-th entry is
+    data[x-1]^{-1} * data[x], with data[-1] taken to be last_element.
+    '''
+    table = DEC_TABLE
+    out = bytearray(len(data))
+    for i, byte in enumerate(data):
+        out[i] = table[(last_element << 8) | byte]
+        last_element = byte
+    return out
 
 
 def stream_encryptor(input_stream, output_stream):
@@ -93,12 +148,13 @@ def stream_encryptor(input_stream, output_stream):
     the word and output_stream[x] is on the right of the word, with respect to
     the conventions followed in the rest of this module.
     '''
-    running_product = IDENTITY
+    running_product = 0
     while True:
-        byte = input_stream.read(1)
-        if byte:
-            running_product = quasidihedral_256_times(running_product, byte)
-            output_stream.write(running_product)
+        chunk = input_stream.read(CHUNK_SIZE)
+        if chunk:
+            out = _encrypt(chunk, running_product)
+            output_stream.write(out)
+            running_product = out[-1]
         else:
             break
 
@@ -107,13 +163,12 @@ def stream_decryptor(input_stream, output_stream):
     '''
     Decrypt output_stream to input_stream.
     '''
-    last_element = IDENTITY
+    last_element = 0
     while True:
-        byte = input_stream.read(1)
-        if byte:
-            output_stream.write(quasidihedral_256_times(
-                quasidihedral_256_inverse(last_element), byte))
-            last_element = byte
+        chunk = input_stream.read(CHUNK_SIZE)
+        if chunk:
+            output_stream.write(_decrypt(chunk, last_element))
+            last_element = chunk[-1]
         else:
             break
 
@@ -122,26 +177,21 @@ def get_random_bytes(length):
     '''
     Return a random bytes object of specified length
     '''
-    return b''.join(
-        randrange(256).to_bytes(1, byteorder='little', signed=False)
-        for _ in range(length)
-    )
+    return randbytes(length)
 
 
 class Tests(TestCase):
     # pylint: disable=missing-function-docstring,missing-class-docstring
 
     def test_identity_law(self):
-        for x in range(256):
-            x = x.to_bytes(1, 'little', signed=False)
+        for x in ELEMENTS:
             id_x = quasidihedral_256_times(IDENTITY, x)
             x_id = quasidihedral_256_times(x, IDENTITY)
             self.assertEqual(id_x, x)
             self.assertEqual(x_id, x)
 
     def test_inverse_law(self):
-        for x in range(256):
-            x = x.to_bytes(1, 'little', signed=False)
+        for x in ELEMENTS:
             inv = quasidihedral_256_inverse(x)
             prod = quasidihedral_256_times(x, inv)
             self.assertEqual(prod, IDENTITY, str(x))
@@ -161,7 +211,7 @@ class Tests(TestCase):
     def test_fuzz(self):
         for s in range(20):
             seed(s)
-            initial_plaintext = BytesIO(get_random_bytes(1000))
+            initial_plaintext = BytesIO(get_random_bytes(FUZZ_LEN))
             ciphertext = BytesIO()
             final_plaintext = BytesIO()
 
@@ -173,29 +223,36 @@ class Tests(TestCase):
             final_plaintext.seek(0)
             self.assertEqual(initial_plaintext.read(), final_plaintext.read())
 
+    def test_chunk_boundaries(self):
+        seed(0)
+        plaintext_bytes = get_random_bytes(2*CHUNK_SIZE + 1)
+        ciphertext_stream = BytesIO()
+        stream_encryptor(BytesIO(plaintext_bytes), ciphertext_stream)
+        self.assertEqual(ciphertext_stream.getvalue(), _encrypt(plaintext_bytes))
+        ciphertext_stream.seek(0)
+        decrypted_stream = BytesIO()
+        stream_decryptor(ciphertext_stream, decrypted_stream)
+        self.assertEqual(decrypted_stream.getvalue(), plaintext_bytes)
+
     def test_subgroup_of_order_2(self):
         for i1 in range(2):
             for i2 in range(2):
-                s1 = (128*i1).to_bytes(1, 'little', signed=False)
-                s2 = (128*i2).to_bytes(1, 'little', signed=False)
+                s1 = ELEMENTS[128*i1]
+                s2 = ELEMENTS[128*i2]
                 ans = quasidihedral_256_times(s1, s2)
-                exp = (128*int(bool(i1) ^ bool(i2))).to_bytes(1, 'little', signed=False)
+                exp = ELEMENTS[128*int(bool(i1) ^ bool(i2))]
                 self.assertEqual(ans, exp, f"{s1} * {s2}")
 
     def test_subgroup_of_order_128(self):
+        # Row i1 of the table restricted to powers of R is r^i1 * r^i2.
         for i1 in range(0, 128):
-            for i2 in range(0, 128):
-                r1 = i1.to_bytes(1, 'little', signed=False)
-                r2 = i2.to_bytes(1, 'little', signed=False)
-                ans = quasidihedral_256_times(r1, r2)
-                exp = ((i1 + i2) % 128).to_bytes(1, 'little', signed=False)
-                self.assertEqual(ans, exp, f"{r1} * {r2}")
+            ans = MUL_TABLE[256*i1:256*i1 + 128]
+            exp = bytes((i1 + i2) % 128 for i2 in range(0, 128))
+            self.assertEqual(ans, exp, f"{i1}")
 
     def test_conjugator(self):
         '''Conjugate powers of R by S'''
-        for i1 in range(0, 128):
-            r_to_the_i1 = i1.to_bytes(1, 'little', signed=False)
-            p = quasidihedral_256_times(S, r_to_the_i1)
-            ans = quasidihedral_256_times(p, S)
-            exp = ((63*i1) % 128).to_bytes(1, 'little', signed=False)
-            self.assertEqual(ans, exp, f"{i1}")
+        s_times_r = MUL_TABLE[256*128:256*128 + 128]
+        ans = bytes(MUL_TABLE[256*p + 128] for p in s_times_r)
+        exp = bytes((63*i1) % 128 for i1 in range(0, 128))
+        self.assertEqual(ans, exp)
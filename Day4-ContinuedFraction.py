@@ -24,10 +24,15 @@ chris.kimmel@live.com
 
 
 from fractions import Fraction
-from math import floor
-from random import randrange, seed
+from os import environ
+from random import Random
 from unittest import TestCase
 
+try:
+    from gmpy2 import mpz
+except ImportError:  # gmpy2 is optional; plain ints give the same results
+    mpz = int
+
 
 NONPOS_ERRMESS = 'This subroutine can only compute continued fractions of '\
                  'positive numbers.'
@@ -37,6 +42,10 @@ NO_PLAINTEXT_ERRMESS = 'This fraction does not correspond to any sequence of '\
 
 DEFAULT_KEY = Fraction(17/9)
 
+# Plaintext length for the fuzz test; set FUZZ_LEN in the environment to run a
+# longer stress test.
+FUZZ_LEN = int(environ.get('FUZZ_LEN', '1024'))
+
 
 def encrypt_cont_frac(plaintext, key=DEFAULT_KEY):
     '''
@@ -50,32 +59,40 @@ def encrypt_cont_frac(plaintext, key=DEFAULT_KEY):
     '''
     assert plaintext, "This algorithm cannot encrypt an empty string"
 
-    the_rest, last_byte = plaintext[:-1], plaintext[-1:]
-    trailing_int = Fraction(int.from_bytes(last_byte, 'little', signed=False))
-    ciphertext = 2 + trailing_int
-    while the_rest:
-        the_rest, last_byte = the_rest[:-1], the_rest[-1:]
-        trailing_int = Fraction(int.from_bytes(last_byte, 'little', signed=False))
-        ciphertext = 2 + trailing_int + 1/ciphertext
-    ciphertext += key
-    return ciphertext
-        
+    # Fold the coefficients in from the right with the convergent recurrence
+    # p/q <- (c*p + q)/p, which keeps p and q coprime without any gcd calls.
+    coefficients = reversed(plaintext)
+    numerator, denominator = mpz(next(coefficients) + 2), mpz(1)
+    for byte in coefficients:
+        numerator, denominator = (byte + 2)*numerator + denominator, numerator
+    return Fraction(int(numerator*key.denominator + denominator*key.numerator),
+                    int(denominator*key.denominator))
 
 
 def decrypt_cont_frac(ciphertext, key=DEFAULT_KEY):
     '''
     Arguments:
-        ciphertext (Fraction)
+        ciphertext (Fraction, or a (numerator, denominator) tuple of ints)
         key (Fraction)
     Returns:
         plaintext (bytes)
     Requires:
         ciphertext-key is > 1, and all coefficients in its canonical continued
             fraction representation are >= 2
+        if ciphertext is a tuple, its denominator is positive
     '''
-    the_cont_frac = cont_frac(ciphertext-key)
+    if isinstance(ciphertext, tuple):
+        numerator, denominator = ciphertext
+    else:
+        numerator, denominator = ciphertext.numerator, ciphertext.denominator
+    # The difference is left unreduced: scaling a numerator and denominator
+    # by a common factor does not change the quotients Euclid's algorithm
+    # produces, so there is no need to pay for a gcd here.
+    the_cont_frac = _cont_frac(
+        numerator*key.denominator - key.numerator*denominator,
+        denominator*key.denominator)
     assert all(x >= 2 for x in the_cont_frac), NO_PLAINTEXT_ERRMESS
-    return b''.join((x-2).to_bytes(1, 'little', signed=False) for x in the_cont_frac)
+    return bytes(x-2 for x in the_cont_frac)
 
 
 def cont_frac(x):
@@ -91,20 +108,28 @@ def cont_frac(x):
     Requires:
         frac > 0
     '''
-    assert x > 0, NONPOS_ERRMESS
-    integer_part = floor(x)
-    fractional_part = x - integer_part
-    return [integer_part] + cont_frac(1/fractional_part) if fractional_part \
-        else [integer_part]
+    return _cont_frac(x.numerator, x.denominator)
+
+
+def _cont_frac(numerator, denominator):
+    '''
+    Compute cont_frac(Fraction(numerator, denominator)) using only integer
+    arithmetic. The arguments need not be coprime, but denominator must be
+    positive.
+    '''
+    assert numerator > 0, NONPOS_ERRMESS
+    numerator, denominator = mpz(numerator), mpz(denominator)
+    retval = []
+    while denominator:
+        integer_part, remainder = divmod(numerator, denominator)
+        retval.append(int(integer_part))
+        numerator, denominator = denominator, remainder
+    return retval
 
 
 def get_random_bytes(length, seedval):
     '''Return a random bytes object of specified length.'''
-    seed(seedval)
-    return b''.join(
-        randrange(256).to_bytes(1, byteorder='little', signed=False)
-        for _ in range(length)
-    )
+    return Random(seedval).randbytes(length)
 
 
 class TestContFrac(TestCase):
@@ -153,6 +178,11 @@ class TestDecrypt(TestCase):
             exp = t[1]
             self.assertEqual(ans, exp, t[0])
 
+    def test_tuple(self):
+        ciphertext = Fraction(7, 3) + DEFAULT_KEY
+        ans = decrypt_cont_frac((3*ciphertext.numerator, 3*ciphertext.denominator))
+        self.assertEqual(ans, b'\x00\x01')
+
     def test_impossible(self):
         with self.assertRaises(Exception, msg=NONPOS_ERRMESS):
             _ = decrypt_cont_frac(Fraction(0))
@@ -168,7 +198,13 @@ class TestTogether(TestCase):
 
     def test_fuzz(self):
         for i in range(0, 50):
-            plaintext = get_random_bytes(length=10**2, seedval=i)
+            plaintext = get_random_bytes(length=FUZZ_LEN, seedval=i)
             ciphertext = encrypt_cont_frac(plaintext)
             new_plaintext = decrypt_cont_frac(ciphertext)
             self.assertEqual(plaintext, new_plaintext)
+
+    def test_long(self):
+        plaintext = get_random_bytes(length=10**4, seedval=0)
+        ciphertext = encrypt_cont_frac(plaintext)
+        new_plaintext = decrypt_cont_frac(ciphertext)
+        self.assertEqual(plaintext, new_plaintext)